@@ -1,14 +1,35 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
 import json
 import re
-from datetime import datetime
 from urllib.parse import urlparse
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson  # opcional: (de)serialização de JSON bem mais rápida
+
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+try:
+    import httpx  # opcional: só é usado com CITSMART_HTTP2 = True
+except ImportError:
+    httpx = None
 
 try:
     import config  # type: ignore
@@ -17,14 +38,65 @@ except ImportError as exc:
         "Configuração não encontrada. Certifique-se de que o arquivo 'config.py' exista no mesmo diretório."
     ) from exc
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
 # ======================= CONFIG ZABBIX =======================
 # As constantes relativas ao Zabbix são obtidas do arquivo de configuração.
 ZABBIX_API_URL = config.ZABBIX_API_URL
 ZABBIX_API_TOKEN = config.ZABBIX_API_TOKEN
 ZABBIX_VERIFY_SSL = config.ZABBIX_VERIFY_SSL
 
+# Verificação SSL: certificado fixado (*_CA_BUNDLE) tem prioridade sobre o bool.
+_ZBX_VERIFY = getattr(config, "ZABBIX_CA_BUNDLE", "") or ZABBIX_VERIFY_SSL
+_CITSMART_VERIFY = getattr(config, "CITSMART_CA_BUNDLE", "") or getattr(config, "CITSMART_VERIFY_SSL", False)
+
+# Suprimir avisos SSL só quando alguma conexão realmente estiver sem verificação
+if not _ZBX_VERIFY or not _CITSMART_VERIFY:
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Sessão única para a API do Zabbix: reaproveita conexões keep-alive entre as
+# chamadas JSON-RPC (evita um novo handshake TCP/TLS a cada requisição).
+# Só falhas de conexão são repetidas (as chamadas JSON-RPC são todas POST).
+_ZBX_SESSION = requests.Session()
+_ZBX_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3),
+)
+_ZBX_SESSION.mount("http://", _ZBX_ADAPTER)
+_ZBX_SESSION.mount("https://", _ZBX_ADAPTER)
+_ZBX_SESSION.verify = _ZBX_VERIFY
+_ZBX_SESSION.headers.update(
+    {"Content-Type": "application/json", "Authorization": f"Bearer {ZABBIX_API_TOKEN}"}
+)
+
+
+def _post_json(session, url: str, obj, headers: dict | None = None, timeout=None):
+    """POST com o corpo já serializado (orjson quando disponível), sem espaços.
+
+    O Content-Type application/json vem dos headers padrão da sessão (ou de `headers`).
+    """
+    body = _json_dumps(obj)
+    if httpx is not None and isinstance(session, httpx.Client):
+        return session.post(url, content=body, headers=headers, timeout=timeout)
+    return session.post(url, data=body, headers=headers, timeout=timeout)
+
+
+def _fmt_now() -> str:
+    """Data/hora local no formato YYYY-MM-DD HH:MM:SS (sem passar por datetime.strftime)."""
+    t = time.localtime()
+    return f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} {t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}"
+
+
+_log_fd: int | None = None
+
+
+def _get_log_fd(log_file: str) -> int:
+    """Abre o arquivo de log uma única vez por processo (O_APPEND)."""
+    global _log_fd
+    if _log_fd is None:
+        _log_fd = os.open(log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        atexit.register(os.close, _log_fd)
+    return _log_fd
+
 
 def _log_ticket_action(action: str, ticket_number: str, id_atividade: str = "", nome_atividade: str = "") -> None:
     """
@@ -39,11 +111,12 @@ def _log_ticket_action(action: str, ticket_number: str, id_atividade: str = "",
     log_file = os.environ.get("CITSMART_LOG_FILE") or os.path.join(
         os.path.dirname(os.path.abspath(__file__)), "tickets.log"
     )
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ts = _fmt_now()
     line = f"{ts} {action.upper()} ticket={ticket_number}\n"
     try:
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(line)
+        # Uma linha curta com O_APPEND é gravada de forma atômica (POSIX), mesmo
+        # com vários processos escrevendo no mesmo arquivo.
+        os.write(_get_log_fd(log_file), line.encode("utf-8"))
     except Exception:
         # log nunca deve quebrar o fluxo principal
         pass
@@ -51,16 +124,9 @@ def _log_ticket_action(action: str, ticket_number: str, id_atividade: str = "",
 
 def zabbix_api(method: str, params: dict):
     payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {ZABBIX_API_TOKEN}"}
     try:
-        r = requests.post(
-            ZABBIX_API_URL,
-            json=payload,
-            headers=headers,
-            verify=ZABBIX_VERIFY_SSL,
-            timeout=(10, 60),
-        )
-        data = r.json()
+        r = _post_json(_ZBX_SESSION, ZABBIX_API_URL, payload, timeout=(10, 60))
+        data = _json_loads(r.content)
     except Exception as e:
         return None
 
@@ -86,6 +152,9 @@ def extract_ticket_from_acks(event_obj: dict) -> str | None:
     acks = event_obj.get("acknowledges") or []
     for ack in acks:
         msg = ack.get("message") or ""
+        # Teste de substring (em C) descarta a maioria das mensagens antes do regex.
+        if "CITSmartTicketID" not in msg:
+            continue
         m = TICKET_RE.search(msg)
         if m:
             return m.group(1)
@@ -97,8 +166,8 @@ def get_event_with_acks(event_id: str) -> dict | None:
         "event.get",
         {
             "eventids": [str(event_id)],
-            "output": ["eventid", "objectid", "value", "clock"],
-            "select_acknowledges": ["message", "clock"],
+            "output": ["eventid", "objectid"],
+            "select_acknowledges": ["message"],
         },
     )
     if not res:
@@ -108,8 +177,8 @@ def get_event_with_acks(event_id: str) -> dict | None:
     return None
 
 
-def get_latest_problem_event_for_trigger(trigger_id: str) -> dict | None:
-    # Busca eventos de problema (value=1) do trigger e pega o mais recente.
+def _get_problem_events_for_trigger(trigger_id: str, limit: int) -> list:
+    # Eventos de problema (value=1) do trigger, do mais recente para o mais antigo.
     res = zabbix_api(
         "event.get",
         {
@@ -117,23 +186,31 @@ def get_latest_problem_event_for_trigger(trigger_id: str) -> dict | None:
             "source": 0,  # 0 = triggers
             "objectids": [str(trigger_id)],
             "value": 1,
-            "output": ["eventid", "objectid", "value", "clock"],
-            "select_acknowledges": ["message", "clock"],
+            "output": ["eventid", "objectid"],
+            "select_acknowledges": ["message"],
             "sortfield": ["clock"],
             "sortorder": "DESC",
-            "limit": 20,
+            "limit": limit,
         },
     )
-    if not res or not isinstance(res, list):
+    return res if isinstance(res, list) else []
+
+
+def get_latest_problem_event_for_trigger(trigger_id: str) -> dict | None:
+    # Normalmente o último problema já tem o ticket no ack: busca só ele primeiro.
+    latest = _get_problem_events_for_trigger(trigger_id, 1)
+    if not latest:
         return None
+    if extract_ticket_from_acks(latest[0]):
+        return latest[0]
 
-    # Normalmente o primeiro já é o último problema; mas varremos até achar ticket no ack.
-    for ev in res:
+    # Fallback: varre o histórico recente até achar ticket no ack.
+    for ev in _get_problem_events_for_trigger(trigger_id, 20):
         if extract_ticket_from_acks(ev):
             return ev
 
     # Se nenhum tiver ticket, ainda retornamos o mais recente para facilitar debug.
-    return res[0] if res else None
+    return latest[0]
 
 
 def find_ticket_for_zabbix_event(event_id: str) -> tuple[str | None, str | None]:
@@ -175,6 +252,7 @@ class CITSmarTCloser:
         timeout_connect: int = 10,
         timeout_read: int = 60,
         debug: bool = False,
+        use_session_cache: bool = True,
     ):
         self.base_url = self._normalize_base(base_url)
         self.forced_host = forced_host
@@ -184,8 +262,17 @@ class CITSmarTCloser:
         self.timeout = (timeout_connect, timeout_read)
         self.debug = debug
 
-        self.session = requests.Session()
-        self.session.verify = False
+        self.headers = self._build_headers()
+        self.session = self._build_session()
+
+        # Login memoizado: reaproveita o cookie de sessão por até _login_ttl segundos
+        self._logged_in_at: float | None = None
+        self._login_ttl = 20 * 60
+        # True quando a sessão atual não veio de um login feito nesta execução
+        # (cache em disco ou cookies copiados); permite um re-login se ela expirou.
+        self._session_reused = False
+        # Cache de sessão entre execuções: só é usado se CITSMART_SESSION_CACHE estiver definido
+        self._session_cache_file = (os.environ.get("CITSMART_SESSION_CACHE") or None) if use_session_cache else None
 
         self.real_url = "/citsmart/serviceRequestIncident/serviceRequestIncident.load"
 
@@ -196,7 +283,20 @@ class CITSmarTCloser:
         self.ep_validate = "/citsmart/rest/citajax/ticket/serviceRequestIncident/validateConcurrentAccess"
         self.ep_save = "/citsmart/rest/citajax/ticket/serviceRequestIncident/saveOrUpdate"
 
-        self.headers = self._build_headers()
+        # URLs completas calculadas uma única vez (evita concatenação a cada POST)
+        self.urls = {
+            name: self.base_url + path
+            for name, path in {
+                "login": self.login_path,
+                "restore": self.ep_restore,
+                "groups": self.ep_groups,
+                "capture": self.ep_capture,
+                "validate": self.ep_validate,
+                "save": self.ep_save,
+            }.items()
+        }
+
+        self._load_session_cache()
 
     def _normalize_base(self, base: str) -> str:
         base = (base or "").strip().rstrip("/")
@@ -225,38 +325,146 @@ class CITSmarTCloser:
             h["Host"] = self.forced_host
         return h
 
-    def _post(self, path: str, payload: dict, headers: dict | None = None):
-        url = self.base_url + path
-        h = headers or self.headers
-        r = self.session.post(url, json=payload, headers=h, timeout=self.timeout)
+    def _build_session(self):
+        """Cria o cliente HTTP do CITSmart.
+
+        Padrão: requests.Session com pool/retries ajustados. Com CITSMART_HTTP2 = True
+        (e o pacote httpx[http2] instalado) usa httpx.Client, multiplexando todas as
+        chamadas do fluxo em uma única conexão HTTP/2.
+        """
+        verify = _CITSMART_VERIFY
+        if getattr(config, "CITSMART_HTTP2", False) and httpx is not None:
+            connect, read = self.timeout
+            timeout = httpx.Timeout(read, connect=connect)
+            try:
+                client = httpx.Client(
+                    http2=True,
+                    verify=verify,
+                    limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+                    timeout=timeout,
+                    headers=self.headers,
+                )
+            except ImportError:
+                # httpx instalado sem o extra http2 (pacote h2): segue com requests
+                pass
+            else:
+                self.timeout = timeout
+                return client
+
+        session = requests.Session()
+        session.verify = verify
+        # Só repete falhas de conexão (a requisição não chegou ao servidor): um
+        # saveOrUpdate/capturarTarefa que expirou no proxy pode já ter sido aplicado.
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(self.headers)
+        return session
+
+    def _post(self, url: str, payload: dict, expect_json: bool = False):
+        # `url` já vem completa de self.urls; os headers ficam na sessão.
+        r = _post_json(self.session, url, payload, timeout=self.timeout)
+        expirada = r.status_code in (401, 403)
+        if not expirada and expect_json and self._session_reused and r.status_code == 200:
+            # Sessão reaproveitada e expirada pode vir como 200 + página de login (HTML)
+            expirada = r.content.lstrip()[:1] not in (b"{", b"[")
+        if expirada:
+            # Sessão expirada no servidor: refaz o login uma vez e repete a chamada.
+            if self.login(force=True):
+                r = _post_json(self.session, url, payload, timeout=self.timeout)
         return r
 
     def _now_dt(self):
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return _fmt_now()
 
     def _die(self, msg: str, code: int = 2):
         print(f"❌ {msg}", file=sys.stderr)
         sys.exit(code)
 
-    def login(self) -> bool:
+    def _session_cache_key(self) -> tuple[str, str]:
+        return (self.user, self.base_url)
+
+    def _load_session_cache(self) -> None:
+        """Restaura os cookies de um login anterior (outra execução do script), se ainda válido.
+
+        O cache é JSON puro (nome, valor, domínio e caminho de cada cookie).
+        """
+        if not self._session_cache_file:
+            return
+        try:
+            with open(self._session_cache_file, "rb") as f:
+                cached = _json_loads(f.read())
+        except Exception:
+            return
+        if not isinstance(cached, dict) or cached.get("key") != list(self._session_cache_key()):
+            return
+        age = time.time() - float(cached.get("saved_at") or 0)
+        if age < 0 or age >= self._login_ttl:
+            return
+        cookies = cached.get("cookies")
+        if not cookies:
+            return
+        try:
+            for name, value, domain, path in cookies:
+                self.session.cookies.set(name, value, domain=domain, path=path)
+        except (TypeError, ValueError):
+            return
+        self._logged_in_at = time.monotonic() - age
+        self._session_reused = True
+
+    def _save_session_cache(self) -> None:
+        if not self._session_cache_file:
+            return
+        jar = getattr(self.session.cookies, "jar", self.session.cookies)
+        if not list(jar):
+            # login sem cookie de sessão: nada que valha a pena reaproveitar
+            return
+        cached = {
+            "key": self._session_cache_key(),
+            "saved_at": time.time(),
+            "cookies": [(c.name, c.value, c.domain, c.path) for c in jar],
+        }
+        try:
+            os.makedirs(os.path.dirname(self._session_cache_file) or ".", exist_ok=True)
+            fd = os.open(self._session_cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            # O modo do os.open só vale na criação: restringe também um arquivo já existente.
+            os.fchmod(fd, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(_json_dumps(cached))
+        except Exception:
+            # cache de sessão é só otimização; nunca deve quebrar o fluxo principal
+            pass
+
+    def login(self, force: bool = False) -> bool:
+        if not force and self._logged_in_at is not None and time.monotonic() - self._logged_in_at < self._login_ttl:
+            return True
+
         print("Realizando login no CITSmart...")
-        url = self.base_url + self.login_path
+        url = self.urls["login"]
         payload = {"userName": self.user, "password": self.password, "platform": self.platform}
 
-        headers = {"Content-Type": "application/json", "Accept": "application/json"}
-        if self.forced_host:
-            headers["Host"] = self.forced_host
+        # Content-Type e Host já vêm da sessão; o login só difere no Accept.
+        r = _post_json(self.session, url, payload, {"Accept": "application/json"}, self.timeout)
+        if r.status_code != 200:
+            self._logged_in_at = None
+            return False
 
-        r = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
-        return r.status_code == 200
+        self._logged_in_at = time.monotonic()
+        self._session_reused = False
+        self._save_session_cache()
+        return True
 
     def restore_request(self, ticket_id: int, view: bool = False) -> dict:
         payload = {"object": {"idSolicitacaoServico": int(ticket_id), "view": bool(view)}, "realUrl": self.real_url}
-        r = self._post(self.ep_restore, payload)
+        r = self._post(self.urls["restore"], payload, expect_json=True)
         if r.status_code != 200:
             self._die(f"restoreRequest falhou (HTTP {r.status_code}).")
         try:
-            dto = r.json()
+            dto = _json_loads(r.content)
         except Exception:
             self._die("restoreRequest não retornou JSON.")
         if not isinstance(dto, dict) or "id" not in dto:
@@ -265,18 +473,18 @@ class CITSmarTCloser:
 
     def groups_for_capture(self, id_item_trabalho: int):
         payload = {"object": {"idItemTrabalho": int(id_item_trabalho)}, "realUrl": self.real_url}
-        r = self._post(self.ep_groups, payload)
+        r = self._post(self.urls["groups"], payload)
         if r.status_code != 200:
             self._die(f"groupsForCapture falhou (HTTP {r.status_code}).")
         return r
 
     def capturar_tarefa(self, dto: dict):
         payload = {"object": dto, "realUrl": self.real_url}
-        r = self._post(self.ep_capture, payload)
+        r = self._post(self.urls["capture"], payload, expect_json=True)
         if r.status_code != 200:
             self._die(f"capturarTarefa falhou (HTTP {r.status_code}).")
         try:
-            return r.json()
+            return _json_loads(r.content)
         except Exception:
             return {}
 
@@ -285,17 +493,17 @@ class CITSmarTCloser:
         if id_usuario_responsavel_atual is not None:
             obj["idUsuarioResponsavelAtual"] = int(id_usuario_responsavel_atual)
         payload = {"object": obj, "realUrl": self.real_url}
-        r = self._post(self.ep_validate, payload)
+        r = self._post(self.urls["validate"], payload, expect_json=True)
         if r.status_code != 200:
             return None
         try:
-            return r.json()
+            return _json_loads(r.content)
         except Exception:
             return None
 
     def save_or_update(self, dto: dict):
         payload = {"object": dto, "realUrl": self.real_url}
-        r = self._post(self.ep_save, payload)
+        r = self._post(self.urls["save"], payload)
         if r.status_code != 200:
             self._die(f"saveOrUpdate falhou (HTTP {r.status_code}).", 1)
         return r
@@ -322,6 +530,7 @@ class CITSmarTCloser:
         id_causa_incidente: int = 6,
         solucao_html: str = "<div>Resolvido automaticamente via Zabbix (OK).</div>",
         causa_html: str = "<div>Recuperação detectada pelo Zabbix.</div>",
+        skip_groups_for_capture: bool = False,
     ):
         print("Iniciando fechamento (fluxo completo)...")
 
@@ -338,7 +547,10 @@ class CITSmarTCloser:
         dto1["id"] = int(ticket_id)
         dto1["idItemTrabalho"] = int(id_item_trabalho)
 
-        self.groups_for_capture(id_item_trabalho)
+        # A resposta do groupsForCapture não é usada; em instalações onde o
+        # capturarTarefa não depende dele, dá para economizar o round-trip.
+        if not skip_groups_for_capture:
+            self.groups_for_capture(id_item_trabalho)
         cap = self.capturar_tarefa(dto1)
 
         dt_cap = cap.get("dtLastModification") or dto1.get("dtLastModification") or self._now_dt()
@@ -352,6 +564,7 @@ class CITSmarTCloser:
         self.save_or_update(dto1)
         print("✅ 1º saveOrUpdate OK")
 
+        # O 1º saveOrUpdate avança o fluxo: relê o ticket para pegar o novo idItemTrabalho.
         dto2 = self.restore_request(ticket_id, view=False)
         id_item_2 = dto2.get("idItemTrabalho") or id_item_trabalho
         dto2["id"] = int(ticket_id)
@@ -365,146 +578,184 @@ class CITSmarTCloser:
         print("✅ Fechamento finalizado.")
 
         # LOG de fechamento do ticket (tenta puxar descrição via restoreRequest)
-        try:
-            id_atv = str(dto2.get("idAtividade") or dto1.get("idAtividade") or getattr(config, "ID_ATIVIDADE", "") or "")
-            nome_atv = str(dto2.get("nomeAtividade") or dto2.get("dsAtividade") or dto1.get("nomeAtividade") or dto1.get("dsAtividade") or "")
-            _log_ticket_action("CLOSE", str(ticket_id), id_atv, nome_atv)
-        except Exception:
-            pass
+        id_atv = str(dto2.get("idAtividade") or dto1.get("idAtividade") or getattr(config, "ID_ATIVIDADE", "") or "")
+        nome_atv = str(dto2.get("nomeAtividade") or dto2.get("dsAtividade") or dto1.get("nomeAtividade") or dto1.get("dsAtividade") or "")
+        _log_ticket_action("CLOSE", str(ticket_id), id_atv, nome_atv)
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Uso:")
-        print("  python3 close.py token")
-        print("  python3 close.py fluxo <ticket_id> [solucao_html] [causa_html] [--debug] [--id-item-trabalho X]")
-        print("  python3 close.py zabbix <event_id> [solucao_html] [causa_html]")
-        sys.exit(1)
-
-    cmd = sys.argv[1].lower()
+def fechar_evento_zabbix(closer: "CITSmarTCloser", event_id: str, fluxo_kwargs: dict) -> str | None:
+    """Fecha no CITSmart o ticket associado a um evento do Zabbix.
 
-    # Defaults fixos baseados no arquivo de configuração
-    base = config.CITSMART_BASE_URL
-    host = config.CITSMART_FORCED_HOST
-    user = config.CITSMART_USER
-    pwd = config.CITSMART_PASSWORD
-    platform = config.CITSMART_PLATFORM
-
-    debug = ("--debug" in sys.argv) or ("--print-response" in sys.argv)
-
-    def _get_flag_value(flag: str):
-        if flag in sys.argv:
-            i = sys.argv.index(flag)
-            if i + 1 < len(sys.argv):
-                return sys.argv[i + 1]
+    Retorna o número do ticket fechado, ou None se não foi possível localizá-lo.
+    """
+    event_id = str(event_id).strip()
+
+    # Zabbix e CITSmart são hosts independentes: a busca do ticket e o login
+    # rodam em paralelo (o login fica memoizado para o fluxo de fechamento).
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fut_lookup = ex.submit(find_ticket_for_zabbix_event, event_id)
+        fut_login = ex.submit(closer.login)
+        ticket_id, problem_event_id = fut_lookup.result()
+        fut_login.result()
+    if not ticket_id:
         return None
 
-    id_item_trabalho = _get_flag_value("--id-item-trabalho")
-    if id_item_trabalho is not None:
-        try:
-            id_item_trabalho = int(id_item_trabalho)
-        except ValueError:
-            print("❌ --id-item-trabalho precisa ser inteiro")
-            sys.exit(2)
+    closer.executar_fluxo_fechamento(ticket_id=int(ticket_id), **fluxo_kwargs)
 
-    status_id = _get_flag_value("--status-id")
-    acao_fluxo = _get_flag_value("--acao-fluxo")
-    id_cat = _get_flag_value("--id-categoria-solucao")
-    id_causa = _get_flag_value("--id-causa-incidente")
+    # Opcional: escreve um ack no evento de PROBLEMA (é nele que o Zabbix permite event.acknowledge).
+    if problem_event_id:
+        zabbix_ack_problem_event(problem_event_id, f"CITSmartTicketClosed={ticket_id}")
+    return ticket_id
 
-    timeout_connect = _get_flag_value("--timeout-connect")
-    timeout_read = _get_flag_value("--timeout-read")
 
-    closer = CITSmarTCloser(
-        base_url=base,
-        forced_host=host,
-        user=user,
-        password=pwd,
-        platform=platform,
-        timeout_connect=int(timeout_connect) if timeout_connect else 10,
-        timeout_read=int(timeout_read) if timeout_read else 60,
-        debug=debug,
-    )
+def _build_arg_parser() -> argparse.ArgumentParser:
+    # Flags comuns a todos os subcomandos
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--debug", "--print-response", dest="debug", action="store_true")
+    common.add_argument("--id-item-trabalho", type=int, default=None)
+    common.add_argument("--status-id", type=int, default=4)
+    common.add_argument("--acao-fluxo", default="E")
+    common.add_argument("--id-categoria-solucao", type=int, default=13)
+    common.add_argument("--id-causa-incidente", type=int, default=6)
+    common.add_argument("--timeout-connect", type=int, default=10)
+    common.add_argument("--timeout-read", type=int, default=60)
+    common.add_argument("--skip-groups-for-capture", action="store_true")
 
-    if cmd == "token":
-        ok = closer.login()
-        print("✅ Login OK" if ok else "❌ Login falhou")
-        return
+    parser = argparse.ArgumentParser(prog="close.py", description="Encerramento de chamados no CITSmart.")
+    sub = parser.add_subparsers(dest="cmd", required=True, metavar="{token,fluxo,zabbix,zabbix-batch}")
 
-    if cmd == "fluxo":
-        if len(sys.argv) < 3:
-            print("Uso: python3 close.py fluxo <ticket_id> [solucao_html] [causa_html] ...")
-            sys.exit(1)
+    sub.add_parser("token", parents=[common], help="apenas login")
 
-        try:
-            ticket_id = int(sys.argv[2])
-        except ValueError:
-            print("❌ ticket_id precisa ser inteiro")
-            sys.exit(2)
+    p_fluxo = sub.add_parser("fluxo", parents=[common], help="fecha/resolve ticket (CITSmart)")
+    p_fluxo.add_argument("ticket_id", type=int)
+    p_fluxo.add_argument("solucao_html", nargs="?", default="<div>Resolvido automaticamente via Zabbix (OK).</div>")
+    p_fluxo.add_argument("causa_html", nargs="?", default="<div>Recuperação detectada pelo Zabbix.</div>")
 
-        solucao_html = "<div>Resolvido automaticamente via Zabbix (OK).</div>"
-        causa_html = "<div>Recuperação detectada pelo Zabbix.</div>"
-
-        if len(sys.argv) >= 4 and not sys.argv[3].startswith("--"):
-            solucao_html = sys.argv[3]
-        if len(sys.argv) >= 5 and not sys.argv[4].startswith("--"):
-            causa_html = sys.argv[4]
-
-        closer.executar_fluxo_fechamento(
-            ticket_id=ticket_id,
-            id_item_trabalho=id_item_trabalho,
-            status_id=int(status_id) if status_id else 4,
-            acao_fluxo=str(acao_fluxo) if acao_fluxo else "E",
-            id_categoria_solucao=int(id_cat) if id_cat else 13,
-            id_causa_incidente=int(id_causa) if id_causa else 6,
-            solucao_html=solucao_html,
-            causa_html=causa_html,
-        )
-        return
+    p_zbx = sub.add_parser("zabbix", parents=[common], help="fecha automaticamente via evento do Zabbix")
+    p_zbx.add_argument("event_id")
+    p_zbx.add_argument("solucao_html", nargs="?", default="<div>Problema resolvido automaticamente pelo Zabbix</div>")
+    p_zbx.add_argument("causa_html", nargs="?", default="<div>Trigger voltou ao estado OK</div>")
 
-    if cmd == "zabbix":
-        if len(sys.argv) < 3:
-            print("Uso: python3 close.py zabbix <event_id> [solucao_html] [causa_html]")
-            sys.exit(1)
+    p_batch = sub.add_parser("zabbix-batch", parents=[common], help="fecha vários eventos do Zabbix em paralelo")
+    p_batch.add_argument("event_ids", nargs="+")
+    p_batch.add_argument("--solucao-html", dest="solucao_html", default="<div>Problema resolvido automaticamente pelo Zabbix</div>")
+    p_batch.add_argument("--causa-html", dest="causa_html", default="<div>Trigger voltou ao estado OK</div>")
+    p_batch.add_argument("--max-workers", type=int, default=4)
 
-        event_id = str(sys.argv[2]).strip()
+    # Subparsers por nome, para o parse intercalado em main()
+    parser.subcommands = sub.choices
+    return parser
 
-        solucao_html = "<div>Problema resolvido automaticamente pelo Zabbix</div>"
-        causa_html = "<div>Trigger voltou ao estado OK</div>"
 
-        if len(sys.argv) >= 4 and not sys.argv[3].startswith("--"):
-            solucao_html = sys.argv[3]
-        if len(sys.argv) >= 5 and not sys.argv[4].startswith("--"):
-            causa_html = sys.argv[4]
+def main():
+    argv = sys.argv[1:]
+    if argv:
+        argv[0] = argv[0].lower()
+    parser = _build_arg_parser()
+    # Como na CLI antiga, flags e posicionais podem vir em qualquer ordem
+    # (ex.: `fluxo 123 --debug "<div>...</div>"`): parse intercalado no subcomando.
+    if argv and argv[0] in parser.subcommands:
+        args = parser.subcommands[argv[0]].parse_intermixed_args(argv[1:])
+        args.cmd = argv[0]
+    else:
+        args = parser.parse_args(argv)
 
-        ticket_id, problem_event_id = find_ticket_for_zabbix_event(event_id)
-        if not ticket_id:
-            print("❌ Não foi possível localizar o número do ticket no evento relacionado.")
-            sys.exit(2)
+    # Defaults fixos baseados no arquivo de configuração
+    closer = CITSmarTCloser(
+        base_url=config.CITSMART_BASE_URL,
+        forced_host=config.CITSMART_FORCED_HOST,
+        user=config.CITSMART_USER,
+        password=config.CITSMART_PASSWORD,
+        platform=config.CITSMART_PLATFORM,
+        timeout_connect=args.timeout_connect,
+        timeout_read=args.timeout_read,
+        debug=args.debug,
+    )
 
-        closer.executar_fluxo_fechamento(
-            ticket_id=int(ticket_id),
-            id_item_trabalho=id_item_trabalho,
-            status_id=int(status_id) if status_id else 4,
-            acao_fluxo=str(acao_fluxo) if acao_fluxo else "E",
-            id_categoria_solucao=int(id_cat) if id_cat else 13,
-            id_causa_incidente=int(id_causa) if id_causa else 6,
-            solucao_html=solucao_html,
-            causa_html=causa_html,
-        )
+    if args.cmd == "token":
+        ok = closer.login(force=True)
+        print("✅ Login OK" if ok else "❌ Login falhou")
+        return
 
-        # Opcional: escreve um ack no evento de PROBLEMA (é nele que o Zabbix permite event.acknowledge).
-        if problem_event_id:
-            zabbix_ack_problem_event(problem_event_id, f"CITSmartTicketClosed={ticket_id}")
+    fluxo_kwargs = dict(
+        id_item_trabalho=args.id_item_trabalho,
+        status_id=args.status_id,
+        acao_fluxo=args.acao_fluxo,
+        id_categoria_solucao=args.id_categoria_solucao,
+        id_causa_incidente=args.id_causa_incidente,
+        solucao_html=args.solucao_html,
+        causa_html=args.causa_html,
+        skip_groups_for_capture=args.skip_groups_for_capture,
+    )
 
+    if args.cmd == "fluxo":
+        closer.executar_fluxo_fechamento(ticket_id=args.ticket_id, **fluxo_kwargs)
+        return
+
+    if args.cmd == "zabbix":
+        ticket_id = fechar_evento_zabbix(closer, args.event_id, fluxo_kwargs)
+        if not ticket_id:
+            print("❌ Não foi possível localizar o número do ticket no evento relacionado.")
+            sys.exit(2)
         print(f"✅ Fechamento OK (ticket {ticket_id})")
         return
 
-    print("Comandos disponíveis:")
-    print("  token   - apenas login")
-    print("  fluxo   - fecha/resolve ticket (CITSmart)")
-    print("  zabbix  - fecha automaticamente via evento do Zabbix")
-    sys.exit(1)
+    if args.cmd == "zabbix-batch":
+        event_ids = [str(e).strip() for e in args.event_ids]
+        max_workers = max(1, args.max_workers)
+
+        # 1) Localiza o ticket de cada evento; eventos que levam ao mesmo ticket
+        #    (ex.: vários recoveries do mesmo problema) fecham o ticket uma única vez.
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            encontrados = dict(zip(event_ids, ex.map(find_ticket_for_zabbix_event, event_ids)))
+
+        por_ticket: dict[str, list[str]] = {}
+        falhas = 0
+        for event_id, (ticket_id, _problem_event_id) in encontrados.items():
+            if ticket_id:
+                por_ticket.setdefault(ticket_id, []).append(event_id)
+            else:
+                falhas += 1
+                print(f"❌ Evento {event_id}: ticket não localizado no evento relacionado")
+
+        def _fechar(ticket_id: str):
+            # Cada thread faz seu próprio login (sem o cache de sessão em disco): o fluxo
+            # capturar/validar/salvar não é compartilhado em uma mesma sessão do CITSmart.
+            worker = CITSmarTCloser(
+                base_url=config.CITSMART_BASE_URL,
+                forced_host=config.CITSMART_FORCED_HOST,
+                user=config.CITSMART_USER,
+                password=config.CITSMART_PASSWORD,
+                platform=config.CITSMART_PLATFORM,
+                timeout_connect=args.timeout_connect,
+                timeout_read=args.timeout_read,
+                debug=args.debug,
+                use_session_cache=False,
+            )
+            worker.executar_fluxo_fechamento(ticket_id=int(ticket_id), **fluxo_kwargs)
+
+        # 2) Fecha cada ticket distinto em paralelo
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            futuros = {ticket_id: ex.submit(_fechar, ticket_id) for ticket_id in por_ticket}
+            for ticket_id, fut in futuros.items():
+                eventos = por_ticket[ticket_id]
+                try:
+                    fut.result()
+                except (Exception, SystemExit) as exc:  # _die() usa sys.exit dentro da thread
+                    falhas += len(eventos)
+                    for event_id in eventos:
+                        print(f"❌ Evento {event_id}: falha no fechamento do ticket {ticket_id} ({exc!r})")
+                    continue
+
+                # Ack uma vez por evento de problema (eventos de recovery podem apontar para o mesmo)
+                problemas = {encontrados[event_id][1] for event_id in eventos} - {None}
+                for problem_event_id in problemas:
+                    zabbix_ack_problem_event(problem_event_id, f"CITSmartTicketClosed={ticket_id}")
+                for event_id in eventos:
+                    print(f"✅ Evento {event_id}: fechamento OK (ticket {ticket_id})")
+        if falhas:
+            sys.exit(2)
+        return
 
 if __name__ == "__main__":
     main()
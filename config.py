@@ -17,6 +17,18 @@ CITSMART_PASSWORD: str = "SENHA_DO_USUÁRIO_CITSMART_AQUI"
 # Plataforma utilizada no login do CITSmart.
 CITSMART_PLATFORM: str = "WS"
 
+# Usa HTTP/2 (httpx) nas chamadas ao CITSmart. Requer: pip install "httpx[http2]".
+# Se o pacote não estiver instalado, o script continua usando requests.
+CITSMART_HTTP2: bool = False
+
+# Validação do certificado SSL do CITSmart.
+# False → certificado autoassinado / ambiente interno; True → certificado válido.
+CITSMART_VERIFY_SSL: bool = False
+
+# Caminho do certificado (PEM) do servidor CITSmart. Se preenchido, tem prioridade
+# sobre CITSMART_VERIFY_SSL.
+CITSMART_CA_BUNDLE: str = ""
+
 # =====================================================================
 # Configurações fixas do fluxo CITSmart (customizáveis pelo usuário)
 # =====================================================================
@@ -34,3 +46,6 @@ ID_GRUPO_DESTINO: str = "71"
 ZABBIX_API_URL: str = "https://IP_ZABBIX_AQUI/zabbix/api_jsonrpc.php"
 ZABBIX_API_TOKEN: str = "TOKEN_API_ZABBIX_AQUI"
 ZABBIX_VERIFY_SSL: bool = False
+
+# Caminho do certificado (PEM) do Zabbix. Se preenchido, tem prioridade sobre ZABBIX_VERIFY_SSL.
+ZABBIX_CA_BUNDLE: str = ""
@@ -1,13 +1,31 @@
 #!/usr/bin/env python3
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sys
 import urllib.parse
-from datetime import datetime
 import json
+import logging
 import re
 import urllib3
 import os
+import atexit
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson  # opcional: (de)serialização de JSON bem mais rápida
+
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
 
 try:
     import config  # type: ignore
@@ -16,10 +34,103 @@ except ImportError as exc:
         "Configuração não encontrada. Certifique-se de que o arquivo 'config.py' exista no mesmo diretório."
     ) from exc
 
+# Mensagens de progresso vão para stdout via logging (sem buffer: cada linha aparece
+# na hora, mesmo se o processo for morto por timeout). Falhas usam warning/error.
+logger = logging.getLogger("citsmart")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_STDOUT_HANDLER = logging.StreamHandler(sys.stdout)
+_STDOUT_HANDLER.setLevel(logging.INFO)
+logger.addHandler(_STDOUT_HANDLER)
+
 ZABBIX_API_URL = config.ZABBIX_API_URL
 ZABBIX_API_TOKEN = config.ZABBIX_API_TOKEN
 ZABBIX_VERIFY_SSL = config.ZABBIX_VERIFY_SSL
 
+# Verificação SSL: certificado fixado (*_CA_BUNDLE) tem prioridade sobre o bool.
+_ZBX_VERIFY = getattr(config, "ZABBIX_CA_BUNDLE", "") or ZABBIX_VERIFY_SSL
+_CITSMART_VERIFY = getattr(config, "CITSMART_CA_BUNDLE", "") or getattr(config, "CITSMART_VERIFY_SSL", False)
+
+# Suprimir avisos SSL só quando alguma conexão realmente estiver sem verificação
+if not _ZBX_VERIFY or not _CITSMART_VERIFY:
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Sessão única para a API do Zabbix (keep-alive + pool de conexões do urllib3)
+_ZBX_SESSION = requests.Session()
+_ZBX_SESSION.mount(
+    "https://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=Retry(total=2, backoff_factor=0.2)),
+)
+_ZBX_SESSION.verify = _ZBX_VERIFY
+_ZBX_SESSION.headers.update({"Content-Type": "application/json-rpc"})
+
+# Campos fixos de toda chamada JSON-RPC
+_RPC_BASE = {"jsonrpc": "2.0", "id": 1, "auth": ZABBIX_API_TOKEN}
+
+
+# Buffer do log de tickets: as linhas são acumuladas em memória e gravadas em lote
+# (ao atingir CITSMART_LOG_BUFFER linhas, no término do processo ou em SIGTERM).
+# CITSMART_LOG_UNBUFFERED=1 grava cada linha imediatamente. A linha OPEN é gravada
+# logo em seguida pelos chamadores, pois o processo pode ser morto por timeout.
+_LOG_BUF: list[str] = []
+_LOG_LOCK = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    """Inteiro positivo de uma variável de ambiente; valor ausente/inválido usa o padrão."""
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+_LOG_THRESHOLD = _env_int("CITSMART_LOG_BUFFER", 32)
+_LOG_UNBUFFERED = os.environ.get("CITSMART_LOG_UNBUFFERED") == "1"
+_LOG_FD: int | None = None
+_TS_CACHE: list = [0, ""]  # [segundo epoch, "YYYY-MM-DD HH:MM:SS"]
+
+
+def _get_log_fd() -> int:
+    """Abre o arquivo de log uma única vez por processo (O_APPEND: escrita atômica no POSIX)."""
+    global _LOG_FD
+    if _LOG_FD is None:
+        log_file = os.environ.get("CITSMART_LOG_FILE") or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "tickets.log"
+        )
+        _LOG_FD = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    return _LOG_FD
+
+
+def _flush_log() -> None:
+    """Grava no arquivo de log as linhas pendentes no buffer (um único os.write)."""
+    with _LOG_LOCK:
+        if not _LOG_BUF:
+            return
+        data = "".join(_LOG_BUF).encode("utf-8")
+        _LOG_BUF.clear()
+        try:
+            os.write(_get_log_fd(), data)
+        except Exception:
+            # log nunca deve quebrar o fluxo principal
+            pass
+
+
+def _close_log() -> None:
+    global _LOG_FD
+    _flush_log()
+    if _LOG_FD is not None:
+        os.close(_LOG_FD)
+        _LOG_FD = None
+
+
+def _exit_on_sigterm(signum, frame):
+    # Só encerra: o flush dos buffers fica com os hooks do atexit, já fora de
+    # qualquer `with _LOG_LOCK` (o lock não é reentrante).
+    sys.exit(128 + signum)
+
+
+atexit.register(_close_log)
+
 
 def _log_ticket_action(action: str, ticket_number: str, id_atividade: str = "", nome_atividade: str = "") -> None:
     """
@@ -31,17 +142,16 @@ def _log_ticket_action(action: str, ticket_number: str, id_atividade: str = "",
     OBS: arquivo padrão 'tickets.log' no mesmo diretório do script.
     Pode ser sobrescrito por variável de ambiente: CITSMART_LOG_FILE
     """
-    log_file = os.environ.get("CITSMART_LOG_FILE") or os.path.join(
-        os.path.dirname(os.path.abspath(__file__)), "tickets.log"
-    )
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    line = f"{ts} {action.upper()} ticket={ticket_number}\n"
-    try:
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(line)
-    except Exception:
-        # log nunca deve quebrar o fluxo principal
-        pass
+    with _LOG_LOCK:
+        # strftime só uma vez por segundo; as demais linhas reaproveitam o texto
+        now = int(time.time())
+        if _TS_CACHE[0] != now:
+            _TS_CACHE[0] = now
+            _TS_CACHE[1] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        _LOG_BUF.append(f"{_TS_CACHE[1]} {action.upper()} ticket={ticket_number}\n")
+        pending = len(_LOG_BUF)
+    if _LOG_UNBUFFERED or pending >= _LOG_THRESHOLD:
+        _flush_log()
 
 
 def zabbix_api(method: str, params: dict):
@@ -52,26 +162,19 @@ def zabbix_api(method: str, params: dict):
     :param params: Dicionário com os parâmetros do método.
     :return: Resultado retornado pelo Zabbix ou None em caso de erro.
     """
-    payload = {
-        "jsonrpc": "2.0",
-        "method": method,
-        "params": params,
-        "id": 1,
-        "auth": ZABBIX_API_TOKEN,
-    }
+    payload = {**_RPC_BASE, "method": method, "params": params}
     try:
-        response = requests.post(
-            ZABBIX_API_URL, json=payload, verify=ZABBIX_VERIFY_SSL
-        )
+        # Corpo já serializado; o Content-Type (application/json-rpc) vem da sessão.
+        response = _ZBX_SESSION.post(ZABBIX_API_URL, data=_json_dumps(payload), timeout=(3.05, 30))
         response.raise_for_status()
-        data = response.json()
+        data = _json_loads(response.content)
         # Verifica se houve erro
         if isinstance(data, dict) and data.get("error"):
-            print(f"Erro na API do Zabbix: {data['error']}")
+            logger.error(f"Erro na API do Zabbix: {data['error']}")
             return None
         return data.get("result")
     except Exception as exc:
-        print(f"Erro ao chamar API do Zabbix: {exc}")
+        logger.error(f"Erro ao chamar API do Zabbix: {exc}")
         return None
 
 
@@ -98,8 +201,106 @@ def zabbix_acknowledge(event_id: str, ticket_number: str, observacao: str = ""):
     }
     return zabbix_api("event.acknowledge", params)
 
-# Suprimir avisos SSL
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+def _nocache() -> str:
+    """
+    Valor do campo `nocache` enviado nos formulários do portal (mesmo formato do
+    navegador). Só serve para evitar cache, então a parte fixa do texto não passa
+    pelo strftime.
+    """
+    return time.strftime("%a %b %d %Y %H:%M:%S") + " GMT-0300 (Horário Padrão de Brasília)"
+
+
+# Padrões comuns para números de ticket no HTML de saveMeusPedidos, em ordem de
+# prioridade (o primeiro que casar vence). Compilados uma única vez, como bytes,
+# para buscar direto em response.content sem decodificar o corpo inteiro.
+_TICKET_PATTERNS = tuple(
+    re.compile(p, re.IGNORECASE)
+    for p in (
+        rb"class=\\#33#text-citsmart\\#33#\s*>\s*(\d+)\s*</h[23]>",
+        # Padrão específico do CITSmarT
+        rb"<h2[^>]*class=\"[^\"]*text-citsmart[^\"]*\"[^>]*>\s*(\d+)\s*</h2>",
+        # Padrão HTML mais genérico
+        rb"<span[^>]*class=\"[^\"]*label-numero[^\"]*\"[^>]*>Ticket</span><h2[^>]*class=\"[^\"]*text-citsmart[^\"]*\"[^>]*>\s*(\d+)\s*</h[23]>",
+        # Padrão completo
+        rb"ticket[:\s]*(\d+)",
+        rb"ticketNumber[:\s]*(\d+)",
+        rb"number[:\s]*(\d+)",
+        rb"id[:\s]*(\d+)",
+        rb"(\d{5,})",  # Números com 5+ dígitos (ajustado para capturar 52606)
+    )
+)
+
+
+# idTarefa no HTML/JSON de openAtividade (input hidden, campo JSON ou query string).
+# Alternativas de um único regex em bytes: uma varredura, sem decodificar o corpo.
+_IDTAREFA_RE = re.compile(
+    rb'(?:name="idTarefa"\s*value="(\d+)")|(?:"idTarefa"\s*:\s*"?(\d+)"?)|(?:idTarefa=(\d+))'
+)
+
+# Campos fixos dos formulários do portal (smartPortal.event / delegacaoTarefa.save).
+# Cada requisição só acrescenta os campos dinâmicos (observação, atividade, nocache...).
+_ADD_STATIC = {
+    "uuid": "4149ce29-154f2bfa-cdb2d33b-b13493cb",
+    "idPortfolio": "1",
+    "idServico": "1494",
+    "nomeAtividade": "Erro no Solicita",
+    "mostrarDescPortal": "S",
+    "idQuestionario": "",
+    "questionarioObrigatorio": "false",
+    "questionarioRespondido": "false",
+    "requestStatus": "",
+    "idManager": "0",
+    "serializedBuilderObjects": "{}",
+    "idsItemConfiguracaoSelecionados": "",
+    "idContrato": "2",
+    "requestTitle": "",
+    "nomeDoManager": "",
+    "method": "execute",
+    "parmCount": "",
+    "parm1": "smartPortal",
+    "parm2": "",
+    "parm3": "adicionaSolicitacaoServico",
+}
+
+_SALVAR_STATIC = {
+    "uuid": "",
+    "requestStatus": "",
+    "requestMessage": "",
+    "removeLastTicketWhenErrorOccurs": "true",
+    "method": "execute",
+    "parmCount": "",
+    "parm1": "smartPortal",
+    "parm2": "",
+    "parm3": "saveMeusPedidos",
+}
+
+_ABRIR_STATIC = {
+    "idPortfolio": "1",
+    "idServico": "1494",
+    "tipoPortfolio": "",
+    "nomePortfolio": "Central",
+    "nomeServicoNegocio": "Solicita",
+    "nomeAtividade": "Erro no Solicita",
+    "servicosAdicionados": "",
+    "method": "execute",
+    "parmCount": "",
+    "parm1": "smartPortal",
+    "parm2": "",
+    "parm3": "openAtividade",
+}
+
+_DELEGAR_STATIC = {
+    "acaoFluxo": "D",
+    "idUsuarioDestino": "",
+    "txtFiltro": "",
+    "acUsuario": "",
+}
+
+
+def _trust_config_activity() -> bool:
+    """True (padrão) quando a atividade do config vale para o log, sem consultar o CITSmart."""
+    return os.environ.get("CITSMART_TRUST_CONFIG_ACTIVITY", "1") == "1"
 
 
 class CITSmarTAutomation:
@@ -111,45 +312,96 @@ class CITSmarTAutomation:
                           o valor definido em config.CITSMART_BASE_URL.
         """
         self.base_url = base_url.rstrip("/")
+        # URLs do fluxo, calculadas uma única vez
+        self._url_login = f"{self.base_url}/citsmart/services/login"
+        self._url_event = f"{self.base_url}/citsmart/pages/smartPortal/smartPortal.event"
+        self._url_delegacao = f"{self.base_url}/citsmart/pages/smartPortal/delegacaoTarefa.save"
+        self._url_restore = f"{self.base_url}/citsmart/rest/citajax/ticket/serviceRequestIncident/restoreRequest"
+        self._referer = f"{self.base_url}/citsmart/pages/smartPortal/smartPortal.load"
         self.session = requests.Session()
         # Aceitar ou não certificado SSL é configurado no objeto session;
-        # manter False se o certificado for autoassinado.
-        self.session.verify = False
+        # CITSMART_VERIFY_SSL = False (padrão) se o certificado for autoassinado.
+        self.session.verify = _CITSMART_VERIFY
+        # Pool/retries explícitos: o fluxo faz 5-7 POSTs seguidos no mesmo host.
+        # Só falhas de conexão são repetidas: POSTs não são reenviados após chegar ao servidor.
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Headers comuns a todo o fluxo ficam na sessão. O Content-Type é definido pelo
+        # próprio requests: form-urlencoded para data=, application/json para json=.
+        self.session.headers.update({
+            "Connection": "keep-alive",
+            "Referer": self._referer,
+        })
+        # JSON endpoints (login/restoreRequest) só diferem no Accept
+        self._json_headers = {"Accept": "application/json"}
+        # DTOs de restoreRequest já buscados, por número de ticket
+        self._restore_cache: dict[str, dict] = {}
 
     def login(self):
         """Realiza login no sistema e obtém cookies"""
-        print("Realizando login no sistema CITSmarT...")
+        logger.info("Realizando login no sistema CITSmarT...")
 
-        login_url = f"{self.base_url}/citsmart/services/login"
+        login_url = self._url_login
         login_data = {
             "userName": config.CITSMART_USER,
             "password": config.CITSMART_PASSWORD,
             "platform": config.CITSMART_PLATFORM,
         }
 
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-        }
-
         try:
             response = self.session.post(
                 login_url,
                 json=login_data,
-                headers=headers,
+                headers=self._json_headers,
             )
 
             if response.status_code == 200:
-                print("Login realizado com sucesso!")
+                logger.info("Login realizado com sucesso!")
                 return True
             else:
-                print(f"Erro no login. Status code: {response.status_code}")
+                logger.error(f"Erro no login. Status code: {response.status_code}")
                 return False
 
         except Exception as e:
-            print(f"Erro durante o login: {e}")
+            logger.error(f"Erro durante o login: {e}")
             return False
 
+    def _restore_request(self, ticket_number: str) -> dict:
+        """
+        Busca os dados da solicitação via restoreRequest (endpoint REST citajax, o mesmo
+        usado no close.py). O DTO fica em cache por ticket, evitando repetir a chamada
+        entre _get_ticket_activity_info e delegar_tarefa.
+
+        :return: DTO da solicitação ou {} em caso de falha.
+        """
+        key = str(ticket_number)
+        if key in self._restore_cache:
+            return self._restore_cache[key]
+
+        dto = {}
+        try:
+            url_restore = self._url_restore
+            payload_restore = {
+                "object": {"idSolicitacaoServico": int(ticket_number)},
+                "realUrl": "/citsmart/serviceRequestIncident/serviceRequestIncident.load",
+            }
+            rrestore = self.session.post(url_restore, json=payload_restore, headers=self._json_headers)
+            if rrestore.status_code == 200 and rrestore.content:
+                parsed = _json_loads(rrestore.content)
+                if isinstance(parsed, dict):
+                    dto = parsed
+        except Exception:
+            # falha ao chamar restoreRequest: segue com os valores de fallback de cada chamador
+            pass
+
+        self._restore_cache[key] = dto
+        return dto
+
     def _get_ticket_activity_info(self, ticket_number: str) -> tuple[str, str]:
         """
         Tenta buscar do próprio CITSmart (restoreRequest) a atividade relacionada ao ticket,
@@ -159,18 +411,15 @@ class CITSmarTAutomation:
         fallback_id = str(getattr(config, "ID_ATIVIDADE", "") or "")
         fallback_nome = "Erro no Solicita"
 
+        # O chamado é aberto justamente com essa atividade (ver adicionar_solicitacao_servico),
+        # então por padrão não é preciso consultar o CITSmart. CITSMART_TRUST_CONFIG_ACTIVITY=0
+        # força a consulta via restoreRequest.
+        if _trust_config_activity():
+            return fallback_id, fallback_nome
+
         try:
-            url_restore = f"{self.base_url}/citsmart/rest/citajax/ticket/serviceRequestIncident/restoreRequest"
-            payload_restore = {
-                "object": {"idSolicitacaoServico": int(ticket_number)},
-                "realUrl": "/citsmart/serviceRequestIncident/serviceRequestIncident.load",
-            }
-            headers_restore = {"Content-Type": "application/json", "Accept": "application/json"}
-            rrestore = self.session.post(url_restore, json=payload_restore, headers=headers_restore)
-            if rrestore.status_code != 200:
-                return fallback_id, fallback_nome
-            dto = rrestore.json() if rrestore.content else {}
-            if not isinstance(dto, dict):
+            dto = self._restore_request(ticket_number)
+            if not dto:
                 return fallback_id, fallback_nome
 
             id_atividade = str(dto.get("idAtividade") or dto.get("id_atividade") or dto.get("idActivity") or fallback_id)
@@ -188,85 +437,42 @@ class CITSmarTAutomation:
 
     def adicionar_solicitacao_servico(self, observacao="teste"):
         """Adiciona uma solicitação de serviço"""
-        print("Adicionando solicitação de serviço...")
-        print(f"Descrição do chamado: {observacao}")
+        logger.info("Adicionando solicitação de serviço...")
+        logger.info(f"Descrição do chamado: {observacao}")
 
-        url = f"{self.base_url}/citsmart/pages/smartPortal/smartPortal.event"
+        url = self._url_event
 
         data = {
-            "uuid": "4149ce29-154f2bfa-cdb2d33b-b13493cb",
-            "idPortfolio": "1",
-            "idServico": "1494",
+            **_ADD_STATIC,
             "idAtividade": config.ID_ATIVIDADE,
-            "nomeAtividade": "Erro no Solicita",
-            "mostrarDescPortal": "S",
-            "idQuestionario": "",
-            "questionarioObrigatorio": "false",
-            "questionarioRespondido": "false",
-            "requestStatus": "",
-            "idManager": "0",
-            "serializedBuilderObjects": "{}",
-            "idsItemConfiguracaoSelecionados": "",
-            "idContrato": "2",
-            "requestTitle": "",
             "solicitacaoObservacao": observacao,
-            "nomeDoManager": "",
-            "method": "execute",
-            "parmCount": "",
-            "parm1": "smartPortal",
-            "parm2": "",
-            "parm3": "adicionaSolicitacaoServico",
-            "nocache": datetime.now().strftime(
-                "%a %b %d %Y %H:%M:%S GMT-0300 (Horário Padrão de Brasília)"
-            ),
-        }
-
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Referer": f"{self.base_url}/citsmart/pages/smartPortal/smartPortal.load",
+            "nocache": _nocache(),
         }
 
         try:
-            response = self.session.post(url, data=data, headers=headers)
+            response = self.session.post(url, data=data)
             return response
         except Exception as e:
-            print(f"Erro ao adicionar solicitação: {e}")
+            logger.error(f"Erro ao adicionar solicitação: {e}")
             return None
 
     def salvar_meus_pedidos(self):
         """Salva os pedidos e retorna o número do ticket"""
-        print("Salvando meus pedidos...")
+        logger.info("Salvando meus pedidos...")
 
-        url = f"{self.base_url}/citsmart/pages/smartPortal/smartPortal.event"
+        url = self._url_event
 
-        data = {
-            "uuid": "",
-            "requestStatus": "",
-            "requestMessage": "",
-            "removeLastTicketWhenErrorOccurs": "true",
-            "method": "execute",
-            "parmCount": "",
-            "parm1": "smartPortal",
-            "parm2": "",
-            "parm3": "saveMeusPedidos",
-            "nocache": datetime.now().strftime(
-                "%a %b %d %Y %H:%M:%S GMT-0300 (Horário Padrão de Brasília)"
-            ),
-        }
-
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Referer": f"{self.base_url}/citsmart/pages/smartPortal/smartPortal.load",
-        }
+        data = {**_SALVAR_STATIC, "nocache": _nocache()}
 
         try:
-            response = self.session.post(url, data=data, headers=headers)
+            response = self.session.post(url, data=data)
 
             # Tentar extrair o número do ticket da resposta
             if response.status_code == 200:
                 try:
-                    # Tentar parsear como JSON primeiro
-                    response_data = response.json()
+                    # Tentar parsear como JSON primeiro (direto dos bytes: o corpo
+                    # HTML não é decodificado em texto quando o parse falha)
+                    response_data = _json_loads(response.content)
 
                     # Procurar por campos que podem conter o número do ticket
                     ticket_number = None
@@ -284,29 +490,14 @@ class CITSmarTAutomation:
                     else:
                         return response, None
 
-                except json.JSONDecodeError:
-                    # Se não for JSON, tentar extrair de texto
-                    response_text = response.text
-
-                    # Padrões comuns para números de ticket
-                    patterns = [
-                        r"class=\\#33#text-citsmart\\#33#\s*>\s*(\d+)\s*</h[23]>",
-                        # Padrão específico do CITSmarT
-                        r"<h2[^>]*class=\"[^\"]*text-citsmart[^\"]*\"[^>]*>\s*(\d+)\s*</h2>",
-                        # Padrão HTML mais genérico
-                        r"<span[^>]*class=\"[^\"]*label-numero[^\"]*\"[^>]*>Ticket</span><h2[^>]*class=\"[^\"]*text-citsmart[^\"]*\"[^>]*>\s*(\d+)\s*</h[23]>",
-                        # Padrão completo
-                        r"ticket[:\s]*(\d+)",
-                        r"ticketNumber[:\s]*(\d+)",
-                        r"number[:\s]*(\d+)",
-                        r"id[:\s]*(\d+)",
-                        r"(\d{5,})",  # Números com 5+ dígitos (ajustado para capturar 52606)
-                    ]
-
-                    for pattern in patterns:
-                        match = re.search(pattern, response_text, re.IGNORECASE)
+                except ValueError:
+                    # Se não for JSON, tentar extrair do HTML (bytes, sem decodificar)
+                    response_body = response.content
+
+                    for pattern in _TICKET_PATTERNS:
+                        match = pattern.search(response_body)
                         if match:
-                            ticket_number = match.group(1)
+                            ticket_number = match.group(1).decode("ascii")
                             return response, ticket_number
 
                     return response, None
@@ -314,44 +505,22 @@ class CITSmarTAutomation:
             return response, None
 
         except Exception as e:
-            print(f"Erro ao salvar pedidos: {e}")
+            logger.error(f"Erro ao salvar pedidos: {e}")
             return None, None
 
     def abrir_atividade(self):
         """Abre uma atividade"""
-        print("Abrindo atividade...")
+        logger.info("Abrindo atividade...")
 
-        url = f"{self.base_url}/citsmart/pages/smartPortal/smartPortal.event"
+        url = self._url_event
 
-        data = {
-            "idPortfolio": "1",
-            "idServico": "1494",
-            "idAtividade": config.ID_ATIVIDADE,
-            "tipoPortfolio": "",
-            "nomePortfolio": "Central",
-            "nomeServicoNegocio": "Solicita",
-            "nomeAtividade": "Erro no Solicita",
-            "servicosAdicionados": "",
-            "method": "execute",
-            "parmCount": "",
-            "parm1": "smartPortal",
-            "parm2": "",
-            "parm3": "openAtividade",
-            "nocache": datetime.now().strftime(
-                "%a %b %d %Y %H:%M:%S GMT-0300 (Horário Padrão de Brasília)"
-            ),
-        }
-
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Referer": f"{self.base_url}/citsmart/pages/smartPortal/smartPortal.load",
-        }
+        data = {**_ABRIR_STATIC, "idAtividade": config.ID_ATIVIDADE, "nocache": _nocache()}
 
         try:
-            response = self.session.post(url, data=data, headers=headers)
+            response = self.session.post(url, data=data)
             return response
         except Exception as e:
-            print(f"Erro ao abrir atividade: {e}")
+            logger.error(f"Erro ao abrir atividade: {e}")
             return None
 
     def delegar_tarefa(self, ticket_number: str, observacao: str = "", id_grupo_destino: str = config.ID_GRUPO_DESTINO):
@@ -371,136 +540,123 @@ class CITSmarTAutomation:
         :param id_grupo_destino: ID do grupo de destino (padrão: "71").
         :return: Objeto Response ou None em caso de erro.
         """
-        print("Delegando tarefa para o grupo", id_grupo_destino)
+        logger.info(f"Delegando tarefa para o grupo {id_grupo_destino}")
         # Primeiro, tentar obter o idTarefa e o id interno da solicitação via restoreRequest
         id_tarefa = ""
         id_solicitacao_servico = ticket_number
-        try:
-            # Utiliza o endpoint REST citajax, semelhante ao usado no close.py, para obter dados da solicitação
-            url_restore = f"{self.base_url}/citsmart/rest/citajax/ticket/serviceRequestIncident/restoreRequest"
-            payload_restore = {
-                "object": {"idSolicitacaoServico": int(ticket_number)},
-                "realUrl": "/citsmart/serviceRequestIncident/serviceRequestIncident.load",
-            }
-            headers_restore = {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            }
-            rrestore = self.session.post(
-                url_restore, json=payload_restore, headers=headers_restore
+        dto = self._restore_request(ticket_number)
+        if dto:
+            # idItemTrabalho geralmente corresponde ao idTarefa para delegação; algumas
+            # versões expõem o mesmo valor com outro nome. Só cai no fallback HTML se nenhum vier.
+            id_tarefa = str(dto.get("idItemTrabalho") or dto.get("idTarefa") or dto.get("idTask") or "")
+            # Alguns retornam idSolicitacaoServico ou id, usamos para delegação se disponível
+            id_solicitacao_servico = str(
+                dto.get("idSolicitacaoServico") or dto.get("id") or ticket_number
             )
-            if rrestore.status_code == 200:
-                try:
-                    dto = rrestore.json()
-                    # idItemTrabalho geralmente corresponde ao idTarefa para delegação
-                    id_tarefa = str(dto.get("idItemTrabalho", ""))
-                    # Alguns retornam idSolicitacaoServico ou id, usamos para delegação se disponível
-                    id_solicitacao_servico = str(
-                        dto.get("idSolicitacaoServico") or dto.get("id") or ticket_number
-                    )
-                except Exception:
-                    pass
-        except Exception:
-            # falha ao chamar restoreRequest, prossegue com ticket_number e sem id_tarefa
-            pass
         # Se não conseguiu via restoreRequest, tenta extrair idTarefa da página de atividade
         if not id_tarefa:
             try:
                 resp = self.abrir_atividade()
                 if resp and resp.status_code == 200:
-                    texto = resp.text
-                    patterns = [
-                        r'name="idTarefa"\s*value="(\d+)"',
-                        r'"idTarefa"\s*:\s*"?(\d+)"?',
-                        r'idTarefa=(\d+)',
-                    ]
-                    for pat in patterns:
-                        m = re.search(pat, texto)
-                        if m:
-                            id_tarefa = m.group(1)
-                            break
+                    m = _IDTAREFA_RE.search(resp.content)
+                    if m:
+                        id_tarefa = next(g for g in m.groups() if g).decode("ascii")
             except Exception:
                 pass
 
-        url = f"{self.base_url}/citsmart/pages/smartPortal/delegacaoTarefa.save"
+        url = self._url_delegacao
         # Monta dados para delegação, conforme inspeção da chamada web (payload de delegação)
         data = {
+            **_DELEGAR_STATIC,
             'idSolicitacaoServico': id_solicitacao_servico,
             'idTarefa': id_tarefa,
-            'acaoFluxo': 'D',
-            'idUsuarioDestino': '',
-            'txtFiltro': '',
-            'acUsuario': '',
             'idGrupoDestino': str(id_grupo_destino),
             'delegacaoJustificativa': observacao or 'Delegado automaticamente via integração',
-            'nocache': datetime.now().strftime('%a %b %d %Y %H:%M:%S GMT-0300 (Horário Padrão de Brasília)'),
-        }
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'Referer': f'{self.base_url}/citsmart/pages/smartPortal/smartPortal.load',
+            'nocache': _nocache(),
         }
         try:
-            response = self.session.post(url, data=data, headers=headers)
+            response = self.session.post(url, data=data)
             if response.status_code == 200:
-                print("Delegação efetuada com sucesso!")
+                logger.info("Delegação efetuada com sucesso!")
             else:
-                print(f"Falha ao delegar tarefa. Status: {response.status_code}")
+                logger.error(f"Falha ao delegar tarefa. Status: {response.status_code}")
             return response
         except Exception as e:
-            print(f"Erro ao delegar tarefa: {e}")
+            logger.error(f"Erro ao delegar tarefa: {e}")
             return None
 
     def executar_fluxo_completo(self, observacao="teste"):
         """Executa o fluxo completo de automação"""
-        print("Iniciando fluxo completo de automação...")
+        logger.info("Iniciando fluxo completo de automação...")
 
         # 1. Login
         if not self.login():
-            print("Falha no login. Abortando execução.")
+            logger.error("Falha no login. Abortando execução.")
             return False
 
         # 2. Adicionar solicitação de serviço
         response1 = self.adicionar_solicitacao_servico(observacao)
         if response1 and response1.status_code == 200:
-            print("Solicitação de serviço adicionada com sucesso!")
+            logger.info("Solicitação de serviço adicionada com sucesso!")
         else:
-            print("Falha ao adicionar solicitação de serviço.")
+            logger.error("Falha ao adicionar solicitação de serviço.")
 
         # 3. Salvar meus pedidos
         response2, ticket_number = self.salvar_meus_pedidos()
-        if response2 and response2.status_code == 200:
-            print("Pedidos salvos com sucesso!")
+        pedidos_ok = bool(response2 and response2.status_code == 200)
+
+        # 4. Abrir atividade. Se a atividade do ticket (para o log) precisar ser consultada
+        # via restoreRequest, as duas chamadas rodam em paralelo: são endpoints
+        # independentes e o pool da sessão comporta as duas conexões.
+        info = None
+        if pedidos_ok and ticket_number and not _trust_config_activity():
+            with ThreadPoolExecutor(max_workers=2) as ex:
+                fut_open = ex.submit(self.abrir_atividade)
+                fut_info = ex.submit(self._get_ticket_activity_info, str(ticket_number))
+                info = fut_info.result()
+                response3 = fut_open.result()
+        else:
+            response3 = self.abrir_atividade()
+            if pedidos_ok and ticket_number:
+                info = self._get_ticket_activity_info(str(ticket_number))
+
+        if pedidos_ok:
+            logger.info("Pedidos salvos com sucesso!")
             if ticket_number:
-                print(f"✅ Ticket criado com sucesso! Número: {ticket_number}")
+                logger.info(f"✅ Ticket criado com sucesso! Número: {ticket_number}")
                 # LOG de abertura do ticket (puxando descrição via CITSmart, se possível)
-                id_atv, nome_atv = self._get_ticket_activity_info(str(ticket_number))
+                id_atv, nome_atv = info
                 _log_ticket_action("OPEN", str(ticket_number), id_atv, nome_atv)
+                # o ticket já existe no CITSmart: grava já (um kill por timeout perderia o buffer)
+                _flush_log()
             else:
-                print("⚠️ Ticket criado, mas não foi possível obter o número")
+                logger.warning("⚠️ Ticket criado, mas não foi possível obter o número")
         else:
-            print("Falha ao salvar pedidos.")
+            logger.error("Falha ao salvar pedidos.")
 
-        # 4. Abrir atividade
-        response3 = self.abrir_atividade()
         if response3 and response3.status_code == 200:
-            print("Atividade aberta com sucesso!")
+            logger.info("Atividade aberta com sucesso!")
             # 5. Delegar a tarefa para o grupo padrão (71) se houver ticket
             if ticket_number:
                 # Usa a observação como justificativa da delegação (ou uma mensagem genérica)
                 self.delegar_tarefa(ticket_number, observacao=observacao)
         else:
-            print("Falha ao abrir atividade.")
+            logger.error("Falha ao abrir atividade.")
 
-        print("Fluxo completo finalizado!")
+        logger.info("Fluxo completo finalizado!")
         return True
 
 
 def main():
         """Função principal"""
+        # SIGTERM (ex.: timeout do Zabbix) passa pelo atexit, gravando os logs pendentes
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
         if len(sys.argv) > 1:
             comando = sys.argv[1]
 
-            automation = CITSmarTAutomation()
+            # No zabbix a sessão só é criada depois de validar o evento (ver abaixo):
+            # eventos de recuperação não devem custar nada.
+            automation = CITSmarTAutomation() if comando != "zabbix" else None
 
             # Obter observação se fornecida
             observacao = "teste"  # valor padrão
@@ -523,16 +679,17 @@ def main():
                     response, ticket_number = automation.salvar_meus_pedidos()
                     if response and response.status_code == 200:
                         if ticket_number:
-                            print(f"✅ Ticket criado com sucesso! Número: {ticket_number}")
+                            logger.info(f"✅ Ticket criado com sucesso! Número: {ticket_number}")
                             # LOG de abertura do ticket
                             id_atv, nome_atv = automation._get_ticket_activity_info(str(ticket_number))
                             _log_ticket_action("OPEN", str(ticket_number), id_atv, nome_atv)
+                            _flush_log()
                         else:
-                            print(
+                            logger.warning(
                                 "⚠️ Ticket criado, mas não foi possível obter o número"
                             )
                     else:
-                        print("❌ Falha ao criar ticket")
+                        logger.error("❌ Falha ao criar ticket")
             elif comando == "abrir":
                 # Apenas abrir atividade
                 if automation.login():
@@ -541,26 +698,30 @@ def main():
                 # Integração com Zabbix: abrir chamado e associar ID ao evento
                 # Uso: python open.py zabbix <event_id> <event_value> [descricao]
                 if len(sys.argv) < 4:
-                    print(
+                    logger.error(
                         "Uso: python open.py zabbix <event_id> <event_value> [descricao]"
                     )
                     return
-                event_id = sys.argv[2]
+                event_id = sys.argv[2].strip()
                 event_value = sys.argv[3]
                 # Junta o restante dos argumentos como observação (descrição do alerta)
                 observacao_args = sys.argv[4:] if len(sys.argv) > 4 else []
                 observacao = " ".join(observacao_args) if observacao_args else ""
                 # Apenas cria chamado se o valor do evento for '1' (problema).
                 if str(event_value) != "1":
-                    print("Evento não é de problema, nenhum chamado será aberto.")
+                    logger.info("Evento não é de problema, nenhum chamado será aberto.")
+                    return
+                if not event_id.isdigit():
+                    logger.warning(f"event_id inválido: {event_id!r}. Nenhum chamado será aberto.")
                     return
+                automation = CITSmarTAutomation()
                 # Executa o fluxo CITSmart: login, adicionar solicitação, salvar pedidos e abrir atividade
                 if automation.login():
                     resp_add = automation.adicionar_solicitacao_servico(
                         observacao or "Alerta do Zabbix"
                     )
                     if not resp_add or resp_add.status_code != 200:
-                        print("Falha ao adicionar solicitação de serviço.")
+                        logger.error("Falha ao adicionar solicitação de serviço.")
                         return
                     resp2, ticket_number = automation.salvar_meus_pedidos()
                     if resp2 and resp2.status_code == 200:
@@ -568,20 +729,21 @@ def main():
                         automation.abrir_atividade()
                         # Caso tenhamos número de ticket, podemos delegar e depois associar id ao evento
                         if ticket_number:
-                            print(f"Ticket criado com sucesso! Número: {ticket_number}")
+                            logger.info(f"Ticket criado com sucesso! Número: {ticket_number}")
                             # LOG de abertura do ticket
                             id_atv, nome_atv = automation._get_ticket_activity_info(str(ticket_number))
                             _log_ticket_action("OPEN", str(ticket_number), id_atv, nome_atv)
+                            _flush_log()
                             # Delegar a tarefa para o grupo 71 (justificativa: observacao)
                             automation.delegar_tarefa(ticket_number, observacao=observacao)
                             # Atribui o número do ticket ao evento Zabbix via reconhecimento
                             zabbix_acknowledge(event_id, ticket_number, observacao)
                         else:
-                            print(
+                            logger.warning(
                                 "⚠️ Ticket criado, mas não foi possível obter o número"
                             )
                     else:
-                        print("Falha ao salvar pedidos.")
+                        logger.error("Falha ao salvar pedidos.")
                 return
             else:
                 print("Comandos disponíveis:")